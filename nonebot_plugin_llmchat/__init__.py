@@ -1,14 +1,14 @@
 import asyncio
-from collections import defaultdict, deque
+from collections import deque
 from datetime import datetime
-import json
+from functools import lru_cache
 import os
 import random
-import re
 import time
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Optional, Union, cast
 
 import aiofiles
+import httpx
 from nonebot import (
     get_driver,
     get_plugin_config,
@@ -17,15 +17,17 @@ from nonebot import (
     on_message,
     require,
 )
-from nonebot.adapters.onebot.v11 import GroupMessageEvent, Message
+from nonebot.adapters.onebot.v11 import Bot, GroupMessageEvent, Message
 from nonebot.adapters.onebot.v11.permission import GROUP_ADMIN, GROUP_OWNER
 from nonebot.params import CommandArg
 from nonebot.permission import SUPERUSER
 from nonebot.plugin import PluginMetadata
 from nonebot.rule import Rule
 from openai import AsyncOpenAI
+import orjson
 
 from .config import Config, PresetConfig
+from .semantic_cache import SemanticCache
 
 require("nonebot_plugin_localstore")
 import nonebot_plugin_localstore as store
@@ -34,7 +36,8 @@ require("nonebot_plugin_apscheduler")
 from nonebot_plugin_apscheduler import scheduler
 
 if TYPE_CHECKING:
-    from collections.abc import Iterable
+    from collections.abc import Callable
+    from pathlib import Path
 
     from openai.types.chat import ChatCompletionMessageParam
 
@@ -51,6 +54,27 @@ __plugin_meta__ = PluginMetadata(
 plugin_config = get_plugin_config(Config).llmchat
 driver = get_driver()
 tasks: set["asyncio.Task"] = set()
+nicknames = "、".join(driver.config.nickname)
+# 随机触发概率换算为30位随机整数的阈值
+random_trigger_threshold = int(plugin_config.random_trigger_prob * (1 << 30))
+# 按 (api_base, api_key) 缓存的OpenAI客户端，复用连接池
+_client_cache: dict[tuple[str, str], AsyncOpenAI] = {}
+
+SYSTEM_PROMPT_TEMPLATE = """
+我想要你帮我在群聊中闲聊，大家一般叫你{nicknames}，我将会在后面的信息中告诉你每条群聊信息的发送者和发送时间，你可以直接称呼发送者为他对应的昵称。
+你的回复需要遵守以下几点规则：
+- 你可以使用多条消息回复，每两条消息之间使用<botbr>分隔，<botbr>前后不需要包含额外的换行和空格。
+- 除<botbr>外，消息中不应该包含其他类似的标记。
+- 不要使用markdown格式，聊天软件不支持markdown解析。
+- 你应该以普通人的方式发送消息，每条消息字数要尽量少一些，应该倾向于使用更多条的消息回复。
+- 代码则不需要分段，用单独的一条消息发送。
+- 请使用发送者的昵称称呼发送者，你可以礼貌地问候发送者，但只需要在第一次回答这位发送者的问题时问候他。
+- 你有at群成员的能力，只需要在某条消息中插入[CQ:at,qq=（QQ号）]，也就是CQ码。at发送者是非必要的，你可以根据你自己的想法at某个人。
+- 如果有多条消息，你应该优先回复提到你的，一段时间之前的就不要回复了，也可以直接选择不回复。
+- 如果你需要思考的话，你应该思考尽量少，以节省时间。
+下面是关于你性格的设定，如果设定中提到让你扮演某个人，或者设定中有提到名字，则优先使用设定中的名字。
+{prompt}
+"""
 
 
 def pop_reasoning_content(
@@ -59,18 +83,18 @@ def pop_reasoning_content(
     if content is None:
         return None, None
 
-    think_content: Optional[str] = None
-    # 匹配 <think> 标签和其中的内容
-    if matched := re.match(r"<think>(.*?)</think>", content, flags=re.DOTALL):
-        think_content = matched.group(1)
-
-    # 如果找到了 <think> 标签内容，返回过滤后的文本和标签内的内容，否则只返回过滤后的文本和None
-    if think_content:
-        filtered_content = content.replace(think_content, "").strip()
-        return filtered_content, think_content.strip()
-    else:
+    # 匹配开头的 <think> 标签和其中的内容
+    if not content.startswith("<think>"):
+        return content, None
+    end = content.find("</think>", 7)
+    if end == -1:
         return content, None
 
+    # 找到了 <think> 标签内容时，返回过滤后的文本和标签内的内容，否则只返回过滤后的文本和None
+    think_content = content[7:end].strip()
+    filtered_content = content[end + 8 :].strip()
+    return filtered_content, think_content or None
+
 
 # 初始化群组状态
 class GroupState:
@@ -78,14 +102,30 @@ class GroupState:
         self.preset_name = plugin_config.default_preset
         self.history = deque(maxlen=plugin_config.history_size)
         self.queue = asyncio.Queue()
-        self.processing = False
+        self.worker_task: Optional[asyncio.Task] = None
         self.last_active = time.time()
-        self.past_events = deque(maxlen=plugin_config.past_events_size)
+        # 只保存格式化后的消息，不保留完整的事件对象
+        self.past_events: deque[str] = deque(maxlen=plugin_config.past_events_size)
         self.group_prompt: Optional[str] = None
         self.output_reasoning_content = False
+        self.semantic_cache = SemanticCache(
+            plugin_config.semantic_cache_size, plugin_config.semantic_cache_threshold
+        )
+        self.cached_system_prompt: Optional[str] = None
+        self.cached_prompt_key: Optional[str] = None
+        # 状态自上次保存后是否有变化
+        self.dirty = False
+
 
+group_states: dict[int, GroupState] = {}
 
-group_states: dict[int, GroupState] = defaultdict(GroupState)
+
+# 获取群组状态，不存在时创建，只读的场景应直接使用 group_states.get
+def get_group_state(group_id: int) -> GroupState:
+    state = group_states.get(group_id)
+    if state is None:
+        state = group_states[group_id] = GroupState()
+    return state
 
 
 # 获取当前预设配置
@@ -97,6 +137,86 @@ def get_preset(group_id: int) -> PresetConfig:
     return plugin_config.api_presets[0]  # 默认返回第一个预设
 
 
+# 获取预设对应的OpenAI客户端，相同地址和密钥的预设共用一个客户端
+def _get_client(preset: PresetConfig) -> AsyncOpenAI:
+    key = (preset.api_base, preset.api_key)
+    client = _client_cache.get(key)
+    if client is None:
+        client = _client_cache[key] = AsyncOpenAI(
+            base_url=preset.api_base,
+            api_key=preset.api_key,
+            timeout=plugin_config.request_timeout,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=plugin_config.max_connections,
+                    max_keepalive_connections=plugin_config.max_keepalive_connections,
+                    keepalive_expiry=60,
+                ),
+                timeout=httpx.Timeout(plugin_config.request_timeout, connect=10.0),
+            ),
+        )
+    return client
+
+
+# 获取群组的系统提示词，仅在设定变化时重新生成
+# 系统提示词中不应包含时间等易变内容，以保证其作为请求前缀时能命中API的提示词缓存
+def get_system_prompt(state: GroupState) -> str:
+    if state.cached_system_prompt is None or state.cached_prompt_key != state.group_prompt:
+        state.cached_system_prompt = SYSTEM_PROMPT_TEMPLATE.format_map(
+            {
+                "nicknames": nicknames,
+                "prompt": state.group_prompt or plugin_config.default_prompt,
+            }
+        )
+        state.cached_prompt_key = state.group_prompt
+    return state.cached_system_prompt
+
+
+# 为消息添加缓存断点，用于Anthropic兼容接口的提示词缓存
+def add_cache_control(message: "ChatCompletionMessageParam") -> "ChatCompletionMessageParam":
+    return cast(
+        "ChatCompletionMessageParam",
+        {
+            **message,
+            "content": [
+                {
+                    "type": "text",
+                    "text": message.get("content"),
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ],
+        },
+    )
+
+
+# 获取文本的向量表示，失败时返回None，不影响正常回复
+async def get_embedding(client: AsyncOpenAI, model: str, text: str) -> Optional[list[float]]:
+    text = text.strip()
+    if not text:
+        return None
+    try:
+        response = await client.embeddings.create(model=model, input=text)
+    except Exception as e:
+        logger.opt(exception=e).warning("获取文本向量失败，跳过语义缓存")
+        return None
+    return response.data[0].embedding
+
+
+# 各类消息段转换为文本的方式，未列出的类型忽略
+SEGMENT_HANDLERS: dict[str, "Callable[[dict[str, Any]], str]"] = {
+    "at": lambda data: data.get("name", ""),
+    "image": lambda _: "[图片]",
+    "voice": lambda _: "[语音]",
+    "text": lambda data: data.get("text", ""),
+}
+
+
+# 时间戳格式转换，同一秒内的消息共用结果
+@lru_cache(maxsize=4096)
+def format_time(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
 # 消息格式转换
 def format_message(event: GroupMessageEvent) -> str:
     text_message = ""
@@ -107,42 +227,38 @@ def format_message(event: GroupMessageEvent) -> str:
         text_message += f"@{next(iter(driver.config.nickname))} "
 
     for msgseg in event.get_message():
-        if msgseg.type == "at":
-            text_message += msgseg.data.get("name", "")
-        elif msgseg.type == "image":
-            text_message += "[图片]"
-        elif msgseg.type == "voice":
-            text_message += "[语音]"
-        elif msgseg.type == "face":
-            pass
-        elif msgseg.type == "text":
-            text_message += msgseg.data.get("text", "")
+        if convert := SEGMENT_HANDLERS.get(msgseg.type):
+            text_message += convert(msgseg.data)
 
     message = {
         "SenderNickname": str(event.sender.card or event.sender.nickname),
         "SenderUserId": str(event.user_id),
         "Message": text_message,
-        "SendTime": datetime.fromtimestamp(event.time).isoformat(),
+        "SendTime": format_time(event.time),
     }
-    return json.dumps(message, ensure_ascii=False)
+    return orjson.dumps(message).decode()
 
 
 async def is_triggered(event: GroupMessageEvent) -> bool:
     """扩展后的消息处理规则"""
 
-    state = group_states[event.group_id]
+    state = group_states.get(event.group_id)
+    # 默认关闭时不为未启用的群组创建状态
+    if state is None and plugin_config.default_preset == "off":
+        return False
+    state = get_group_state(event.group_id)
 
     if state.preset_name == "off":
         return False
 
-    state.past_events.append(event)
+    state.past_events.append(format_message(event))
 
     # 原有@触发条件
     if event.is_tome():
         return True
 
-    # 随机触发条件
-    if random.random() < plugin_config.random_trigger_prob:
+    # 随机触发条件，概率为0时不生成随机数
+    if random_trigger_threshold and random.getrandbits(30) < random_trigger_threshold:
         return True
 
     return False
@@ -157,129 +273,250 @@ handler = on_message(
 
 
 @handler.handle()
-async def handle_message(event: GroupMessageEvent):
+async def handle_message(bot: Bot, event: GroupMessageEvent):
     group_id = event.group_id
     logger.debug(
         f"收到群聊消息 群号：{group_id} 用户：{event.user_id} 内容：{event.get_plaintext()}"
     )
 
-    state = group_states[group_id]
+    state = get_group_state(group_id)
+    state.last_active = time.time()
+    state.dirty = True
 
-    await state.queue.put(event)
-    if not state.processing:
-        state.processing = True
-        task = asyncio.create_task(process_messages(group_id))
+    await state.queue.put((bot, event))
+    # 每个群聊只启动一个常驻的消息处理任务
+    if state.worker_task is None or state.worker_task.done():
+        task = state.worker_task = asyncio.create_task(group_worker(group_id))
         task.add_done_callback(tasks.discard)
         tasks.add(task)
 
 
-async def process_messages(group_id: int):
+async def group_worker(group_id: int):
+    state = group_states[group_id]
+    while True:
+        bot, event = await state.queue.get()
+        # 等待一小段时间，将连续触发的消息合并为一次请求
+        await asyncio.sleep(plugin_config.debounce_ms / 1000)
+        count = 1
+        while True:
+            try:
+                bot, event = state.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            count += 1
+        logger.debug(
+            f"从队列获取消息 群号：{group_id} 消息ID：{event.message_id} 合并触发数：{count}"
+        )
+        try:
+            await process_messages(group_id, bot, event)
+        except Exception as e:
+            logger.opt(exception=e).error(f"API请求失败 群号：{group_id}")
+            await bot.send(event, Message(f"服务暂时不可用，请稍后再试\n{e!s}"))
+        finally:
+            for _ in range(count):
+                state.queue.task_done()
+
+
+class ReplySender:
+    """按分段发送回复，相邻两条消息之间至少间隔2秒"""
+
+    def __init__(self, bot: Bot, event: GroupMessageEvent, output_reasoning_content: bool):
+        self.bot = bot
+        self.event = event
+        self.output_reasoning_content = output_reasoning_content
+        self.reasoning_content = ""
+        self.reasoning_sent = False
+        self.last_sent: Optional[float] = None
+        # 已经发送的分段
+        self.sent: list[str] = []
+
+    async def send_reasoning(self):
+        """发送思维过程，只会在第一条回复之前发送一次"""
+        if self.reasoning_sent:
+            return
+        self.reasoning_sent = True
+        if self.output_reasoning_content and self.reasoning_content.strip():
+            await self.bot.send(self.event, Message(self.reasoning_content.strip()))
+
+    async def send(self, segment: str):
+        # 似乎会有空消息的情况导致string index out of range异常
+        if len(segment) == 0 or segment.isspace():
+            return
+        await self.send_reasoning()
+        # 删除前后多余的换行和空格
+        segment = segment.strip()
+        if self.last_sent is not None:
+            await asyncio.sleep(max(0.0, 2 - (time.monotonic() - self.last_sent)))
+        logger.debug(
+            f"发送消息分段 内容：{segment[:50]}..."
+        )  # 只记录前50个字符避免日志过大
+        await self.bot.send(self.event, Message(segment))
+        self.last_sent = time.monotonic()
+        self.sent.append(segment)
+
+
+# 保存一轮对话到历史记录，保证user和assistant穿插，防止R1模型报错
+def append_history(state: GroupState, content: str, reply: str):
+    state.history.append({"role": "user", "content": content})
+    # 添加助手回复到历史
+    state.history.append(
+        {
+            "role": "assistant",
+            "content": reply,
+        }
+    )
+    state.dirty = True
+
+
+async def generate_reply(
+    state: GroupState,
+    sender: ReplySender,
+    preset: PresetConfig,
+    client: AsyncOpenAI,
+    messages: list["ChatCompletionMessageParam"],
+    content: str,
+) -> str:
+    """获取回复并逐段发送，返回完整的回复内容"""
+    group_id = sender.event.group_id
+
+    # 语义缓存：与之前触发过的消息足够相似时直接使用缓存的回复
+    # 仅用于被@触发的回复，随机触发时最后一条消息未必是在向机器人提问
+    embedding: Optional[list[float]] = None
+    cached_reply: Optional[str] = None
+    if plugin_config.semantic_cache and preset.embedding_model and sender.event.is_tome():
+        embedding = await get_embedding(
+            client, preset.embedding_model, sender.event.get_plaintext()
+        )
+        if embedding is not None:
+            cached_reply = state.semantic_cache.lookup(embedding)
+
+    raw_content = ""
+    if cached_reply is not None:
+        logger.info(f"命中语义缓存 群号：{group_id}")
+        raw_content = cached_reply
+        for segment in cached_reply.split("<botbr>"):
+            await sender.send(segment)
+    else:
+        logger.debug(
+            f"发送API请求 模型：{preset.model_name} 历史消息数：{len(messages)}"
+        )
+        stream = await client.chat.completions.create(
+            model=preset.model_name,
+            messages=[*messages, {"role": "user", "content": content}],
+            max_tokens=preset.max_tokens,
+            temperature=preset.temperature,
+            timeout=60,
+            stream=True,
+            # 流式响应默认不返回token用量，需要显式请求
+            stream_options={"include_usage": True},
+        )
+
+        # 边接收边发送，每收到一个完整的分段就立即发送
+        buffer = ""
+        think_checked = False
+        async for chunk in stream:
+            if chunk.usage is not None:
+                logger.debug(f"收到API响应 使用token数：{chunk.usage.total_tokens}")
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if reasoning := getattr(delta, "reasoning_content", None):
+                sender.reasoning_content += reasoning
+            if not delta.content:
+                continue
+            raw_content += delta.content
+            buffer += delta.content
+
+            # 回复以 <think> 开头时，需要等待思维内容结束后才能开始发送
+            if not think_checked:
+                if "<think>".startswith(buffer) or (
+                    buffer.startswith("<think>") and "</think>" not in buffer
+                ):
+                    continue
+                buffer, matched_reasoning_content = pop_reasoning_content(buffer)
+                assert buffer is not None
+                sender.reasoning_content += matched_reasoning_content or ""
+                think_checked = True
+
+            while "<botbr>" in buffer:
+                segment, buffer = buffer.split("<botbr>", 1)
+                await sender.send(segment)
+
+        if not think_checked:
+            buffer, matched_reasoning_content = pop_reasoning_content(buffer)
+            assert buffer is not None
+            sender.reasoning_content += matched_reasoning_content or ""
+        for segment in buffer.split("<botbr>"):
+            await sender.send(segment)
+
+    await sender.send_reasoning()
+
+    reply, _ = pop_reasoning_content(raw_content)
+    assert reply is not None
+
+    # 提及了具体群成员的回复不能复用给其他人
+    event_sender = sender.event.sender
+    names = [name for name in (event_sender.card, event_sender.nickname) if name]
+    if (
+        cached_reply is None
+        and embedding is not None
+        and reply
+        and "[CQ:at" not in reply
+        and not any(name in reply for name in names)
+    ):
+        state.semantic_cache.add(embedding, reply)
+    return reply
+
+
+async def process_messages(group_id: int, bot: Bot, event: GroupMessageEvent):
     state = group_states[group_id]
     preset = get_preset(group_id)
 
-    # 初始化OpenAI客户端
-    client = AsyncOpenAI(
-        base_url=preset.api_base,
-        api_key=preset.api_key,
-        timeout=plugin_config.request_timeout,
-    )
+    client = _get_client(preset)
 
     logger.info(
         f"开始处理群聊消息 群号：{group_id} 当前队列长度：{state.queue.qsize()}"
     )
-    while not state.queue.empty():
-        event = await state.queue.get()
-        logger.debug(f"从队列获取消息 群号：{group_id} 消息ID：{event.message_id}")
-        try:
-            systemPrompt = f"""
-我想要你帮我在群聊中闲聊，大家一般叫你{"、".join(list(driver.config.nickname))}，我将会在后面的信息中告诉你每条群聊信息的发送者和发送时间，你可以直接称呼发送者为他对应的昵称。
-你的回复需要遵守以下几点规则：
-- 你可以使用多条消息回复，每两条消息之间使用<botbr>分隔，<botbr>前后不需要包含额外的换行和空格。
-- 除<botbr>外，消息中不应该包含其他类似的标记。
-- 不要使用markdown格式，聊天软件不支持markdown解析。
-- 你应该以普通人的方式发送消息，每条消息字数要尽量少一些，应该倾向于使用更多条的消息回复。
-- 代码则不需要分段，用单独的一条消息发送。
-- 请使用发送者的昵称称呼发送者，你可以礼貌地问候发送者，但只需要在第一次回答这位发送者的问题时问候他。
-- 你有at群成员的能力，只需要在某条消息中插入[CQ:at,qq=（QQ号）]，也就是CQ码。at发送者是非必要的，你可以根据你自己的想法at某个人。
-- 如果有多条消息，你应该优先回复提到你的，一段时间之前的就不要回复了，也可以直接选择不回复。
-- 如果你需要思考的话，你应该思考尽量少，以节省时间。
-下面是关于你性格的设定，如果设定中提到让你扮演某个人，或者设定中有提到名字，则优先使用设定中的名字。
-{state.group_prompt or plugin_config.default_prompt}
-"""
+    systemPrompt = get_system_prompt(state)
 
-            messages: Iterable[ChatCompletionMessageParam] = [
-                {"role": "system", "content": systemPrompt}
-            ]
+    messages: list[ChatCompletionMessageParam] = [
+        {"role": "system", "content": systemPrompt}
+    ]
 
-            messages += list(state.history)[-plugin_config.history_size :]
-
-            # 没有未处理的消息说明已经被处理了，跳过
-            if state.past_events.__len__() < 1:
-                break
+    # history 已由 deque 的 maxlen 限制长度，无需再截取
+    messages.extend(state.history)
 
-            # 将机器人错过的消息推送给LLM
-            content = ",".join([format_message(ev) for ev in state.past_events])
-
-            logger.debug(
-                f"发送API请求 模型：{preset.model_name} 历史消息数：{len(messages)}"
-            )
-            response = await client.chat.completions.create(
-                model=preset.model_name,
-                messages=[*messages, {"role": "user", "content": content}],
-                max_tokens=preset.max_tokens,
-                temperature=preset.temperature,
-                timeout=60,
-            )
-
-            if response.usage is not None:
-                logger.debug(f"收到API响应 使用token数：{response.usage.total_tokens}")
-
-            # 请求成功后再保存历史记录，保证user和assistant穿插，防止R1模型报错
-            state.history.append({"role": "user", "content": content})
-            state.past_events.clear()
-
-            reply, matched_reasoning_content = pop_reasoning_content(
-                response.choices[0].message.content
-            )
-            reasoning_content: Optional[str] = (
-                getattr(response.choices[0].message, "reasoning_content", None)
-                or matched_reasoning_content
-            )
-
-            if state.output_reasoning_content and reasoning_content:
-                await handler.send(Message(reasoning_content))
-
-            assert reply is not None
-            logger.info(
-                f"准备发送回复消息 群号：{group_id} 消息分段数：{len(reply.split('<botbr>'))}"
-            )
-            for r in reply.split("<botbr>"):
-                # 似乎会有空消息的情况导致string index out of range异常
-                if len(r) == 0 or r.isspace():
-                    continue
-                # 删除前后多余的换行和空格
-                r = r.strip()
-                await asyncio.sleep(2)
-                logger.debug(
-                    f"发送消息分段 内容：{r[:50]}..."
-                )  # 只记录前50个字符避免日志过大
-                await handler.send(Message(r))
-
-            # 添加助手回复到历史
-            state.history.append(
-                {
-                    "role": "assistant",
-                    "content": reply,
-                }
-            )
+    # 在系统提示词和最后一条历史消息上设置缓存断点
+    if preset.enable_prompt_cache:
+        messages[0] = add_cache_control(messages[0])
+        if len(messages) >= 2:
+            messages[-1] = add_cache_control(messages[-1])
 
-        except Exception as e:
-            logger.opt(exception=e).error(f"API请求失败 群号：{group_id}")
-            await handler.send(Message(f"服务暂时不可用，请稍后再试\n{e!s}"))
-        finally:
-            state.queue.task_done()
+    # 没有未处理的消息说明已经被处理了，跳过
+    if state.past_events.__len__() < 1:
+        logger.debug(f"没有未处理的消息，跳过 群号：{group_id}")
+        return
 
-    state.processing = False
+    # 取出本次要推送给LLM的消息，处理期间收到的新消息留给下一次请求
+    batch = list(state.past_events)
+    state.past_events.clear()
+    # 将机器人错过的消息推送给LLM，每条消息单独一行，保证相同消息的编码在不同请求间保持一致
+    content = "\n".join(batch)
+
+    sender = ReplySender(bot, event, state.output_reasoning_content)
+    try:
+        reply = await generate_reply(state, sender, preset, client, messages, content)
+    except Exception:
+        if sender.sent:
+            # 已经发送了部分回复，记录已发送的内容，避免下次触发时重复回答
+            logger.warning(f"回复只发送了一部分 群号：{group_id} 已发送分段数：{len(sender.sent)}")
+            append_history(state, content, "<botbr>".join(sender.sent))
+        else:
+            # 没有发送任何回复时放回消息，下次触发时重试
+            state.past_events = deque([*batch, *state.past_events], maxlen=plugin_config.past_events_size)
+        raise
+    logger.info(f"回复消息发送完成 群号：{group_id} 消息分段数：{len(sender.sent)}")
+    append_history(state, content, reply)
 
 
 # 预设切换命令
@@ -292,17 +529,26 @@ async def handle_preset(event: GroupMessageEvent, args: Message = CommandArg()):
     preset_name = args.extract_plain_text().strip()
 
     if preset_name == "off":
-        group_states[group_id].preset_name = preset_name
+        state = get_group_state(group_id)
+        state.preset_name = preset_name
+        state.dirty = True
         await preset_handler.finish("已关闭llmchat")
 
     available_presets = {p.name for p in plugin_config.api_presets}
     if preset_name not in available_presets:
         available_presets_str = "\n- ".join(available_presets)
+        state = group_states.get(group_id)
+        current_preset = state.preset_name if state else plugin_config.default_preset
         await preset_handler.finish(
-            f"当前API预设：{group_states[group_id].preset_name}\n可用API预设：\n- {available_presets_str}"
+            f"当前API预设：{current_preset}\n可用API预设：\n- {available_presets_str}"
         )
 
-    group_states[group_id].preset_name = preset_name
+    state = get_group_state(group_id)
+    # 不同预设的向量模型不同，旧的缓存向量无法与新模型的向量比较
+    if state.preset_name != preset_name:
+        state.semantic_cache.clear()
+    state.preset_name = preset_name
+    state.dirty = True
     await preset_handler.finish(f"已切换至API预设：{preset_name}")
 
 
@@ -319,7 +565,11 @@ async def handle_edit_preset(event: GroupMessageEvent, args: Message = CommandAr
     group_id = event.group_id
     group_prompt = args.extract_plain_text().strip()
 
-    group_states[group_id].group_prompt = group_prompt
+    state = get_group_state(group_id)
+    state.group_prompt = group_prompt
+    # 设定变化后缓存的回复不再适用
+    state.semantic_cache.clear()
+    state.dirty = True
     await edit_preset_handler.finish("修改成功")
 
 
@@ -335,8 +585,11 @@ reset_handler = on_command(
 async def handle_reset(event: GroupMessageEvent, args: Message = CommandArg()):
     group_id = event.group_id
 
-    group_states[group_id].past_events.clear()
-    group_states[group_id].history.clear()
+    if state := group_states.get(group_id):
+        state.past_events.clear()
+        state.history.clear()
+        state.semantic_cache.clear()
+        state.dirty = True
     await reset_handler.finish("记忆已清空")
 
 
@@ -351,8 +604,9 @@ think_handler = on_command(
 
 @think_handler.handle()
 async def handle_think(event: GroupMessageEvent, args: Message = CommandArg()):
-    state = group_states[event.group_id]
+    state = get_group_state(event.group_id)
     state.output_reasoning_content = not state.output_reasoning_content
+    state.dirty = True
 
     await think_handler.finish(
         f"已{
@@ -365,59 +619,122 @@ async def handle_think(event: GroupMessageEvent, args: Message = CommandArg()):
 
 # 获取插件数据目录
 data_dir = store.get_plugin_data_dir()
-# 获取插件数据文件
-data_file = store.get_plugin_data_file("llmchat_state.json")
-
-
-async def save_state():
-    """保存群组状态到文件"""
-    logger.info(f"开始保存群组状态到文件：{data_file}")
-    data = {
-        gid: {
-            "preset": state.preset_name,
-            "history": list(state.history),
-            "last_active": state.last_active,
-            "group_prompt": state.group_prompt,
-            "output_reasoning_content": state.output_reasoning_content,
-        }
-        for gid, state in group_states.items()
+# 旧版本使用的单一数据文件，加载时迁移为按群组分片的文件
+legacy_data_file = store.get_plugin_data_file("llmchat_state.json")
+
+
+def get_state_file(group_id: int) -> "Path":
+    return data_dir / f"state_{group_id}.json"
+
+
+# 语义缓存体积较大且变化频率与群组状态不同，单独保存
+def get_cache_file(group_id: int) -> "Path":
+    return data_dir / f"semantic_cache_{group_id}.json"
+
+
+def dump_state(state: GroupState) -> dict[str, Any]:
+    return {
+        "preset": state.preset_name,
+        "history": list(state.history),
+        "last_active": state.last_active,
+        "group_prompt": state.group_prompt,
+        "output_reasoning_content": state.output_reasoning_content,
     }
 
-    os.makedirs(os.path.dirname(data_file), exist_ok=True)
-    async with aiofiles.open(data_file, "w", encoding="utf8") as f:
-        await f.write(json.dumps(data, ensure_ascii=False))
+
+def restore_state(state_data: dict[str, Any]) -> GroupState:
+    state = GroupState()
+    state.preset_name = state_data["preset"]
+    state.history = deque(state_data["history"], maxlen=plugin_config.history_size)
+    state.last_active = state_data["last_active"]
+    state.group_prompt = state_data["group_prompt"]
+    state.output_reasoning_content = state_data["output_reasoning_content"]
+    return state
+
+
+async def write_data_file(file: "Path", data: Any, delay: float = 0):
+    """先写入临时文件再替换，避免写入中途出错导致文件损坏"""
+    if delay > 0:
+        await asyncio.sleep(delay)
+    tmp_file = file.with_suffix(".tmp")
+    async with aiofiles.open(tmp_file, "wb") as f:
+        await f.write(orjson.dumps(data))
+    os.replace(tmp_file, file)
+
+
+async def save_state(spread: float = 0):
+    """保存有变化的群组状态到文件，spread 大于0时各群组在该时间（秒）内随机错开写入"""
+    # (群号, 带有dirty标记的对象, 文件, 数据)
+    jobs: list[tuple[int, Union[GroupState, SemanticCache], Path, Any]] = []
+    for gid, state in group_states.items():
+        if state.dirty:
+            jobs.append((gid, state, get_state_file(gid), dump_state(state)))
+            state.dirty = False
+        if state.semantic_cache.dirty:
+            jobs.append((gid, state.semantic_cache, get_cache_file(gid), state.semantic_cache.dump()))
+            state.semantic_cache.dirty = False
+    if not jobs:
+        return
+
+    logger.info(f"开始保存群组状态到目录：{data_dir} 变化文件数：{len(jobs)}")
+    os.makedirs(data_dir, exist_ok=True)
+    results = await asyncio.gather(
+        *[write_data_file(file, data, random.uniform(0, spread)) for _, _, file, data in jobs],
+        return_exceptions=True,
+    )
+    for (gid, owner, file, _), result in zip(jobs, results):
+        if isinstance(result, BaseException):
+            owner.dirty = True
+            logger.opt(exception=result).error(f"保存群组状态失败 群号：{gid} 文件：{file}")
 
 
 async def load_state():
     """从文件加载群组状态"""
-    logger.info(f"从文件加载群组状态：{data_file}")
-    if not os.path.exists(data_file):
-        return
+    logger.info(f"从目录加载群组状态：{data_dir}")
 
-    async with aiofiles.open(data_file, encoding="utf8") as f:
-        data = json.loads(await f.read())
+    migrating = os.path.exists(legacy_data_file)
+    if migrating:
+        async with aiofiles.open(legacy_data_file, "rb") as f:
+            data = orjson.loads(await f.read())
         for gid, state_data in data.items():
-            state = GroupState()
-            state.preset_name = state_data["preset"]
-            state.history = deque(
-                state_data["history"], maxlen=plugin_config.history_size
-            )
-            state.last_active = state_data["last_active"]
-            state.group_prompt = state_data["group_prompt"]
-            state.output_reasoning_content = state_data["output_reasoning_content"]
+            state = restore_state(state_data)
+            state.dirty = True
             group_states[int(gid)] = state
 
+    for state_file in data_dir.glob("state_*.json"):
+        async with aiofiles.open(state_file, "rb") as f:
+            state_data = orjson.loads(await f.read())
+        group_states[int(state_file.stem[len("state_") :])] = restore_state(state_data)
+
+    for cache_file in data_dir.glob("semantic_cache_*.json"):
+        state = group_states.get(int(cache_file.stem[len("semantic_cache_") :]))
+        if state is None:
+            continue
+        async with aiofiles.open(cache_file, "rb") as f:
+            state.semantic_cache.load(orjson.loads(await f.read()))
+
+    if migrating:
+        logger.info(f"迁移旧版本数据文件：{legacy_data_file}")
+        await save_state()
+        if not any(state.dirty or state.semantic_cache.dirty for state in group_states.values()):
+            os.remove(legacy_data_file)
+
 
 # 注册生命周期事件
 @driver.on_startup
 async def init_plugin():
     logger.info("插件启动初始化")
     await load_state()
-    # 每5分钟保存状态
-    scheduler.add_job(save_state, "interval", minutes=5)
+    # 每5分钟保存有变化的状态，加入随机抖动以错开写入
+    scheduler.add_job(save_state, "interval", minutes=5, jitter=30, kwargs={"spread": 2})
 
 
 @driver.on_shutdown
 async def cleanup_plugin():
     logger.info("插件关闭清理")
+    for task in tasks:
+        task.cancel()
     await save_state()
+    for client in _client_cache.values():
+        await client.close()
+    _client_cache.clear()
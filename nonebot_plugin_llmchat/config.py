@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 
@@ -10,6 +12,8 @@ class PresetConfig(BaseModel):
     model_name: str = Field(..., description="模型名称")
     max_tokens: int = Field(2048, description="最大响应token数")
     temperature: float = Field(0.7, description="生成温度（0-2]")
+    embedding_model: Optional[str] = Field(None, description="向量模型名称（用于语义缓存）")
+    enable_prompt_cache: bool = Field(False, description="是否启用提示词缓存断点（Anthropic兼容接口）")
 
 
 class ScopedConfig(BaseModel):
@@ -20,11 +24,19 @@ class ScopedConfig(BaseModel):
     )
     history_size: int = Field(20, description="LLM上下文消息保留数量")
     past_events_size: int = Field(10, description="触发回复时发送的群消息数量")
+    debounce_ms: int = Field(500, ge=0, description="合并连续触发消息的等待时间（毫秒）")
     request_timeout: int = Field(30, description="API请求超时时间（秒）")
+    max_connections: int = Field(512, ge=1, description="API请求最大并发连接数")
+    max_keepalive_connections: int = Field(256, ge=1, description="API请求最大保持连接数")
     default_preset: str = Field("off", description="默认使用的预设名称")
     random_trigger_prob: float = Field(
         0.05, ge=0.0, le=1.0, description="随机触发概率（0-1]"
     )
+    semantic_cache: bool = Field(False, description="是否启用语义缓存")
+    semantic_cache_threshold: float = Field(
+        0.9, ge=0.0, le=1.0, description="语义缓存命中所需的相似度"
+    )
+    semantic_cache_size: int = Field(100, description="每个群聊的语义缓存条数")
     default_prompt: str = Field(
         "你的回答应该尽量简洁、幽默、可以使用一些语气词、颜文字。你应该拒绝回答任何政治相关的问题。",
         description="默认提示词",
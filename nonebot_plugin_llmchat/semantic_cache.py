@@ -0,0 +1,113 @@
+import base64
+from typing import Any, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """基于向量相似度的回复缓存"""
+
+    def __init__(self, maxlen: int, threshold: float):
+        self.maxlen = maxlen
+        self.threshold = threshold
+        # 归一化并量化为int8的向量矩阵，每行一条缓存，作为环形缓冲区使用
+        self._matrix: Optional[np.ndarray] = None
+        # 每行的量化缩放系数
+        self._scales: Optional[np.ndarray] = None
+        self._replies: list[str] = []
+        self._next = 0
+        # 缓存自上次保存后是否有变化
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self._replies)
+
+    def lookup(self, embedding: list[float]) -> Optional[str]:
+        """查找与给定向量最相似的缓存回复，相似度低于阈值时返回None"""
+        if self._matrix is None or self._scales is None or not self._replies:
+            return None
+
+        vector = self._normalize(embedding)
+        # 更换了向量模型导致维度不一致时，旧缓存不再可用
+        if vector is None or vector.shape[0] != self._matrix.shape[1]:
+            return None
+
+        query, query_scale = self._quantize(vector)
+        size = len(self._replies)
+        # 使用int32累加，避免int8乘积求和溢出
+        dots = np.einsum("ij,j->i", self._matrix[:size], query, dtype=np.int32)
+        sims = dots / (self._scales[:size] * query_scale)
+        idx = int(sims.argmax())
+        if sims[idx] >= self.threshold:
+            return self._replies[idx]
+        return None
+
+    def add(self, embedding: list[float], reply: str):
+        vector = self._normalize(embedding)
+        if vector is None or self.maxlen <= 0:
+            return
+        if self._matrix is None or self._scales is None or self._matrix.shape[1] != vector.shape[0]:
+            self._matrix = np.zeros((self.maxlen, vector.shape[0]), dtype=np.int8)
+            self._scales = np.ones(self.maxlen, dtype=np.float32)
+            self._replies.clear()
+            self._next = 0
+
+        self._matrix[self._next], self._scales[self._next] = self._quantize(vector)
+        if len(self._replies) < self.maxlen:
+            self._replies.append(reply)
+        else:
+            self._replies[self._next] = reply
+        self._next = (self._next + 1) % self.maxlen
+        self.dirty = True
+
+    def clear(self):
+        self._matrix = None
+        self._scales = None
+        self._replies.clear()
+        self._next = 0
+        self.dirty = True
+
+    def dump(self) -> dict[str, Any]:
+        """导出量化后的缓存，向量矩阵和缩放系数以base64编码保存"""
+        if self._matrix is None or self._scales is None or not self._replies:
+            return {}
+        # 按从旧到新的顺序导出，加载时可以保持淘汰顺序
+        size = len(self._replies)
+        start = self._next if size == self.maxlen else 0
+        order = (np.arange(size) + start) % size
+        return {
+            "dim": int(self._matrix.shape[1]),
+            "matrix": base64.b64encode(self._matrix[order].tobytes()).decode(),
+            "scales": base64.b64encode(self._scales[order].tobytes()).decode(),
+            "replies": [self._replies[i] for i in order],
+        }
+
+    def load(self, data: dict[str, Any]):
+        self.clear()
+        replies: list[str] = data.get("replies", []) if data else []
+        # 缓存条数配置变小时只保留最新的部分
+        keep = min(len(replies), self.maxlen)
+        if keep > 0:
+            dim = data["dim"]
+            matrix = np.frombuffer(base64.b64decode(data["matrix"]), dtype=np.int8).reshape(-1, dim)
+            scales = np.frombuffer(base64.b64decode(data["scales"]), dtype=np.float32)
+            self._matrix = np.zeros((self.maxlen, dim), dtype=np.int8)
+            self._scales = np.ones(self.maxlen, dtype=np.float32)
+            self._matrix[:keep] = matrix[len(replies) - keep :]
+            self._scales[:keep] = scales[len(replies) - keep :]
+            self._replies = replies[len(replies) - keep :]
+            self._next = keep % self.maxlen
+        self.dirty = False
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    @staticmethod
+    def _quantize(vector: np.ndarray) -> tuple[np.ndarray, float]:
+        scale = 127 / float(np.max(np.abs(vector)))
+        return np.round(vector * scale).astype(np.int8), scale